@@ -0,0 +1,40 @@
+"""
+File manifest shared by validate.py and test_structure.py
+"""
+
+# Files the project needs, grouped for validate.py's report
+REQUIRED_FILES_BY_CATEGORY = {
+    "Main Files": (
+        "chatbot.py",
+        "requirements.txt",
+        ".env.example",
+        ".gitignore",
+        "README.md",
+    ),
+    "Source Code": (
+        "src/__init__.py",
+        "src/agents/__init__.py",
+        "src/agents/rag_agent.py",
+        "src/tools/__init__.py",
+        "src/tools/retrieval_tool.py",
+        "src/utils/__init__.py",
+        "src/utils/vector_store.py",
+        "src/utils/query_cache.py",
+        "src/utils/remote_embeddings.py",
+        "src/utils/embedding_cache.py",
+        "src/utils/chat_history.py",
+        "src/utils/text.py",
+    ),
+    "Sample Documents": (
+        "data/documents/ai_basics.txt",
+        "data/documents/rag_explained.txt",
+        "data/documents/python_best_practices.txt",
+    ),
+}
+
+REQUIRED_FILES = frozenset(
+    path for paths in REQUIRED_FILES_BY_CATEGORY.values() for path in paths
+)
+
+# Python files whose syntax validate.py checks
+PYTHON_FILES = tuple(sorted(path for path in REQUIRED_FILES if path.endswith(".py")))
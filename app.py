@@ -3,13 +3,19 @@ Flask Web Application for Agentic RAG Chatbot
 Provides a modern ChatGPT-like web interface
 """
 
+import json
 import os
 import sys
-from flask import Flask, render_template, request, jsonify
+import threading
+import uuid
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
+from flask_compress import Compress
 from dotenv import load_dotenv
 from src.utils.vector_store import VectorStoreManager
 from src.tools.retrieval_tool import RetrievalTool
 from src.agents.rag_agent import AgenticRAGAgent
+from src.utils.query_cache import QueryCache
+from src.utils.chat_history import redis_history_factory, sqlite_history_factory
 
 # Load environment variables
 load_dotenv()
@@ -26,19 +32,42 @@ if not secret_key:
     )
 app.config['SECRET_KEY'] = secret_key
 
+# Compress JSON replies and the page itself. The SSE stream is left out on
+# purpose: the compressor buffers chunks, which would hold tokens back until
+# the answer is complete.
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html']
+Compress(app)
+
 # Global chatbot instance
 chatbot_agent = None
 
+# Initialization is expensive and must happen once per process; the lock is
+# greenlet-aware once gevent has patched threading
+_init_lock = threading.Lock()
+
 
 def initialize_chatbot(documents_dir: str = "data/documents"):
     """
     Initialize the chatbot instance
     
+    Safe to call concurrently or more than once: callers wait for the first
+    initialization and later calls return immediately.
+    
     Args:
         documents_dir: Directory containing documents to index
     """
     global chatbot_agent
     
+    print("🔒 Waiting for chatbot initialization lock...")
+    with _init_lock:
+        if chatbot_agent is not None:
+            print("Chatbot already initialized, skipping")
+            return
+        chatbot_agent = _build_chatbot(documents_dir)
+
+
+def _build_chatbot(documents_dir: str) -> AgenticRAGAgent:
+    """Build the vector store, tools and agent (called once by initialize_chatbot)"""
     # Verify API key
     if not os.getenv("OPENAI_API_KEY"):
         raise ValueError(
@@ -50,34 +79,67 @@ def initialize_chatbot(documents_dir: str = "data/documents"):
     
     # Initialize vector store
     print("\n📚 Setting up knowledge base...")
-    vector_store_manager = VectorStoreManager(documents_dir=documents_dir)
+    vector_store_manager = VectorStoreManager(
+        documents_dir=documents_dir,
+        embeddings_url=os.getenv("EMBEDDINGS_URL"),  # Shared embedding service, if running
+        backend=os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    )
     
-    # Load and index documents
-    documents = vector_store_manager.load_documents()
-    vectorstore = vector_store_manager.create_vectorstore(documents)
+    # Open the persisted index (documents are only loaded and indexed if it is empty)
+    vectorstore = vector_store_manager.get_or_create_vectorstore()
     retriever = vector_store_manager.get_retriever()
     
     # Create retrieval tool
     print("\n🔧 Creating agent tools...")
-    retrieval_tool = RetrievalTool(retriever)
+    retrieval_tool = RetrievalTool(
+        retriever,
+        batch_search=vector_store_manager.similarity_search_batch
+    )
     tools = [retrieval_tool.as_tool()]
     
     # Initialize agent
     print("\n🧠 Initializing agent...")
     model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
     verbose = os.getenv("CHATBOT_VERBOSE", "False").lower() == "true"
-    chatbot_agent = AgenticRAGAgent(
+    cache_enabled = os.getenv("QUERY_CACHE_ENABLED", "False").lower() == "true"
+    query_cache = QueryCache(
+        embeddings_url=os.getenv("EMBEDDINGS_URL"),
+        local_embedding_model=os.getenv("QUERY_CACHE_EMBEDDING_MODEL"),
+        similarity_threshold=float(os.getenv("QUERY_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+    ) if cache_enabled else None
+    
+    # Conversation history lives outside the worker so every Gunicorn worker
+    # sees the same session: Redis if configured, otherwise a local SQLite file
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        history_factory = redis_history_factory(redis_url)
+    else:
+        history_factory = sqlite_history_factory(os.getenv("CHAT_HISTORY_DB", "chat_history.sqlite"))
+    
+    agent = AgenticRAGAgent(
         tools=tools,
         model_name=model_name,
-        verbose=verbose  # Configurable via CHATBOT_VERBOSE env var
+        verbose=verbose,  # Configurable via CHATBOT_VERBOSE env var
+        query_cache=query_cache,
+        history_factory=history_factory,
+        max_tool_concurrency=int(os.getenv("MAX_TOOL_CONCURRENCY", "5"))
     )
     
     print("\n✅ Chatbot initialized successfully!")
+    return agent
+
+
+def get_session_id() -> str:
+    """Get the conversation id stored in the session cookie, creating one if needed"""
+    if 'session_id' not in session:
+        session['session_id'] = uuid.uuid4().hex
+    return session['session_id']
 
 
 @app.route('/')
 def index():
     """Render the main chat interface"""
+    get_session_id()
     return render_template('index.html')
 
 
@@ -123,7 +185,7 @@ def chat():
             }), 503
         
         # Get response from chatbot
-        response = chatbot_agent.chat(user_message)
+        response = chatbot_agent.chat(user_message, session_id=get_session_id())
         
         return jsonify({
             'success': True,
@@ -143,6 +205,73 @@ def chat():
         }), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Stream the response to a chat message as Server-Sent Events
+    
+    Expected JSON payload:
+    {
+        "message": "user's question"
+    }
+    
+    Streams events of the form:
+        data: {"token": "partial response text"}
+    followed by a final
+        data: {"done": true}
+    or, if something goes wrong mid-stream,
+        data: {"error": "error message"}
+    """
+    data = request.get_json(silent=True)
+    
+    if not data or 'message' not in data:
+        return jsonify({
+            'success': False,
+            'error': 'No message provided'
+        }), 400
+    
+    user_message = data['message'].strip()
+    
+    if not user_message:
+        return jsonify({
+            'success': False,
+            'error': 'Empty message'
+        }), 400
+    
+    # Check if chatbot is initialized
+    if chatbot_agent is None:
+        return jsonify({
+            'success': False,
+            'error': 'Chatbot not initialized. Please check server logs.'
+        }), 503
+    
+    session_id = get_session_id()
+    
+    def generate():
+        try:
+            for token in chatbot_agent.chat_stream(user_message, session_id=session_id):
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield f"data: {json.dumps({'done': True})}\n\n"
+        except Exception as e:
+            # Log detailed error server-side
+            print(f"Error in chat stream endpoint: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            
+            # Return generic error to client for security
+            error = 'An error occurred while processing your message. Please try again.'
+            yield f"data: {json.dumps({'error': error})}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop reverse proxies from buffering the stream
+        }
+    )
+
+
 @app.route('/api/reset', methods=['POST'])
 def reset():
     """
@@ -162,7 +291,7 @@ def reset():
                 'error': 'Chatbot not initialized. Please check server logs.'
             }), 503
         
-        chatbot_agent.reset_memory()
+        chatbot_agent.reset_memory(session_id=get_session_id())
         return jsonify({
             'success': True,
             'message': 'Conversation history cleared'
@@ -190,12 +319,14 @@ def health():
 
 
 def main():
-    """Main entry point for the Flask application"""
+    """
+    Main entry point for the Flask application
+    
+    Hands over to Gunicorn with gevent workers (see gunicorn.conf.py);
+    each worker initializes its own chatbot. Set FLASK_DEBUG=true to use
+    the Flask development server with auto-reload instead.
+    """
     try:
-        # Initialize the chatbot
-        initialize_chatbot()
-        
-        # Run the Flask app
         port = int(os.getenv('PORT', 5000))
         host = os.getenv('FLASK_HOST', '127.0.0.1')  # Default to localhost for security
         debug = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
@@ -203,7 +334,21 @@ def main():
         print(f"\n🌐 Starting web server on http://{host}:{port}")
         print("Press Ctrl+C to stop the server\n")
         
-        app.run(host=host, port=port, debug=debug)
+        if debug:
+            # Development server: the reloader re-runs this in a child process,
+            # so only initialize in the process that actually serves requests
+            if os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+                initialize_chatbot()
+            app.run(host=host, port=port, debug=debug)
+        else:
+            # Replace this process with a fresh `gunicorn -c gunicorn.conf.py app:app`.
+            # This process has already imported the HTTP clients (and ssl), so
+            # gevent's monkey-patching must happen in a new interpreter, where
+            # the config file is loaded before the app.
+            sys.stdout.flush()
+            os.execvp(sys.executable, [
+                sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"
+            ])
         
     except Exception as e:
         print(f"\n❌ Failed to start application: {str(e)}")
@@ -212,6 +357,5 @@ def main():
         print("2. Installed all dependencies: pip install -r requirements.txt")
         sys.exit(1)
 
-
 if __name__ == '__main__':
     main()
@@ -5,10 +5,12 @@ A chatbot implementation using agentic RAG with reasoning capabilities
 
 import os
 import sys
+from typing import Iterator
 from dotenv import load_dotenv
 from src.utils.vector_store import VectorStoreManager
 from src.tools.retrieval_tool import RetrievalTool
 from src.agents.rag_agent import AgenticRAGAgent
+from src.utils.query_cache import QueryCache
 
 
 class AgenticRAGChatbot:
@@ -35,26 +37,36 @@ class AgenticRAGChatbot:
         # Initialize vector store
         print("\n📚 Setting up knowledge base...")
         self.vector_store_manager = VectorStoreManager(
-            documents_dir=documents_dir
+            documents_dir=documents_dir,
+            backend=os.getenv("VECTOR_STORE_BACKEND", "chroma")
         )
         
-        # Load and index documents
-        documents = self.vector_store_manager.load_documents()
-        self.vectorstore = self.vector_store_manager.create_vectorstore(documents)
+        # Open the persisted index (documents are only loaded and indexed if it is empty)
+        self.vectorstore = self.vector_store_manager.get_or_create_vectorstore()
         retriever = self.vector_store_manager.get_retriever()
         
         # Create retrieval tool
         print("\n🔧 Creating agent tools...")
-        retrieval_tool = RetrievalTool(retriever)
+        retrieval_tool = RetrievalTool(
+            retriever,
+            batch_search=self.vector_store_manager.similarity_search_batch
+        )
         tools = [retrieval_tool.as_tool()]
         
         # Initialize agent
         print("\n🧠 Initializing agent...")
         model_name = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        cache_enabled = os.getenv("QUERY_CACHE_ENABLED", "False").lower() == "true"
+        query_cache = QueryCache(
+            local_embedding_model=os.getenv("QUERY_CACHE_EMBEDDING_MODEL"),
+            similarity_threshold=float(os.getenv("QUERY_CACHE_SIMILARITY_THRESHOLD", "0.92"))
+        ) if cache_enabled else None
         self.agent = AgenticRAGAgent(
             tools=tools,
             model_name=model_name,
-            verbose=True
+            verbose=True,
+            query_cache=query_cache,
+            max_tool_concurrency=int(os.getenv("MAX_TOOL_CONCURRENCY", "5"))
         )
         
         print("\n✅ Chatbot initialized successfully!")
@@ -63,6 +75,10 @@ class AgenticRAGChatbot:
         """Send a message to the chatbot"""
         return self.agent.chat(message)
     
+    def chat_stream(self, message: str) -> Iterator[str]:
+        """Send a message to the chatbot and yield the response as it is generated"""
+        return self.agent.chat_stream(message)
+    
     def run_cli(self):
         """Run the chatbot in CLI mode"""
         print("\n" + "="*60)
@@ -102,11 +118,11 @@ class AgenticRAGChatbot:
                         print("\n📝 No conversation history yet.\n")
                     continue
                 
-                # Get response from agent
+                # Print the response from the agent as it is generated
                 print("\n🤖 Assistant: ", end="", flush=True)
-                response = self.chat(user_input)
-                print(response)
-                print()
+                for chunk in self.chat_stream(user_input):
+                    print(chunk, end="", flush=True)
+                print("\n")
                 
             except KeyboardInterrupt:
                 print("\n\n👋 Goodbye!")
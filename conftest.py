@@ -0,0 +1,200 @@
+"""
+Shared pytest configuration for the Agentic RAG Chatbot tests
+"""
+
+import hashlib
+import math
+import os
+import shutil
+import sys
+from typing import List
+import pytest
+
+# Make the src package importable however pytest is started
+sys.path.insert(0, os.path.dirname(__file__))
+
+# No extra plugins; pytest-xdist (if installed) is picked up automatically
+pytest_plugins = []
+
+# pytest cache key of test modules that fully passed: path -> fingerprint
+PASSED_MODULES_KEY = "chatbot/passed_modules"
+
+# Files besides the test modules that can change a test's outcome
+SOURCE_PATTERNS = ("src/**/*.py", "conftest.py", "_manifest.py", "validate.py", "requirements.txt")
+
+
+def pytest_addoption(parser):
+    """Add --skip-unchanged"""
+    parser.addoption(
+        "--skip-unchanged",
+        action="store_true",
+        help="don't collect (or import) test modules that fully passed last "
+             "time when neither they nor the project sources changed"
+    )
+
+
+def _file_fingerprint(path) -> str:
+    """Identity of a file's current version"""
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def _sources_fingerprint(root) -> str:
+    """Fingerprint of every project source the tests exercise"""
+    digest = hashlib.blake2b(digest_size=16)
+    for pattern in SOURCE_PATTERNS:
+        for path in sorted(root.glob(pattern)):
+            digest.update(f"{path.relative_to(root)}:{_file_fingerprint(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SkipUnchanged:
+    """Plugin behind --skip-unchanged, keeping its state in the pytest cache"""
+    
+    def __init__(self, config):
+        self.config = config
+        self.sources = _sources_fingerprint(config.rootpath)
+        self.passed = config.cache.get(PASSED_MODULES_KEY, {})
+        self.outcomes = {}
+        self.skipped_modules = 0
+    
+    def _fingerprint(self, path) -> str:
+        return f"{self.sources}:{_file_fingerprint(path)}"
+    
+    def pytest_ignore_collect(self, collection_path):
+        """Skip test modules that passed and haven't changed since"""
+        if not (collection_path.name.startswith("test_") and collection_path.suffix == ".py"):
+            return None
+        try:
+            module = str(collection_path.relative_to(self.config.rootpath))
+        except ValueError:
+            return None
+        if self.passed.get(module) != self._fingerprint(collection_path):
+            return None
+        self.skipped_modules += 1
+        return True
+    
+    def pytest_runtest_logreport(self, report):
+        """Track whether every test of a module passed (skips don't count)"""
+        module = report.nodeid.split("::")[0]
+        ok = not (report.failed or report.skipped)
+        self.outcomes[module] = self.outcomes.get(module, True) and ok
+    
+    def pytest_sessionfinish(self, session):
+        """Store the fingerprints of modules whose tests all passed"""
+        config = self.config
+        # Nothing left to run because everything is unchanged is a success
+        if session.exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED and self.skipped_modules:
+            session.exitstatus = pytest.ExitCode.OK
+        
+        # xdist workers report to the controller, which writes the cache; a
+        # partial selection says nothing about the rest of a module
+        if hasattr(config, "workerinput"):
+            return
+        if config.option.keyword or config.option.markexpr or any("::" in arg for arg in config.args):
+            return
+        
+        for module, ok in self.outcomes.items():
+            path = config.rootpath / module
+            if ok and path.exists():
+                self.passed[module] = self._fingerprint(path)
+            else:
+                self.passed.pop(module, None)
+        config.cache.set(PASSED_MODULES_KEY, self.passed)
+
+
+def pytest_configure(config):
+    """Register markers and the --skip-unchanged plugin"""
+    # Registered here so they are known even without pytest-xdist
+    config.addinivalue_line(
+        "markers",
+        "xdist_group(name): run tests of the same group on one xdist worker"
+    )
+    
+    if config.getoption("skip_unchanged"):
+        config.pluginmanager.register(SkipUnchanged(config), "skip-unchanged")
+
+
+class FakeEmbeddings:
+    """
+    Deterministic offline embeddings: hashed character trigrams
+    
+    Texts sharing most of their wording get similar vectors, which is all
+    the query cache tests need from a real embedding model.
+    """
+    
+    DIMENSIONS = 256
+    
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.DIMENSIONS
+        padded = f"  {text} "
+        for i in range(len(padded) - 2):
+            digest = hashlib.blake2b(padded[i:i + 3].encode("utf-8"), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % self.DIMENSIONS] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+@pytest.fixture
+def fake_embeddings_factory(tmp_path):
+    """Stand-in for get_cached_embeddings returning FakeEmbeddings behind an EmbeddingCache"""
+    from src.utils.embedding_cache import EmbeddingCache
+    
+    def make(*args, **kwargs):
+        return EmbeddingCache(FakeEmbeddings(), cache_path=str(tmp_path / "embedding_cache.sqlite"))
+    
+    return make
+
+
+@pytest.fixture(scope="session")
+def query_cache_root(tmp_path_factory):
+    """Directory holding the query cache template and every test's copy"""
+    return tmp_path_factory.mktemp("query_cache")
+
+
+@pytest.fixture(scope="session")
+def query_cache_embeddings(query_cache_root):
+    """Give every query cache of the session FakeEmbeddings instead of OpenAI's"""
+    from src.utils import query_cache
+    from src.utils.embedding_cache import EmbeddingCache
+    
+    # Copies live next to the template, so they all share one embedding cache
+    embeddings = EmbeddingCache(
+        FakeEmbeddings(),
+        cache_path=str(query_cache_root / "embedding_cache.sqlite")
+    )
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(query_cache, "get_cached_embeddings", lambda *args, **kwargs: embeddings)
+        yield embeddings
+
+
+@pytest.fixture(scope="session")
+def query_cache_template(query_cache_root, query_cache_embeddings):
+    """
+    Persist directory of an empty, initialized query cache
+    
+    Built once per session; tests get a copy (see make_query_cache) instead of
+    creating a Chroma store from scratch.
+    """
+    from src.utils.query_cache import QueryCache
+    
+    template = query_cache_root / "template"
+    QueryCache(persist_directory=str(template), enabled=True)
+    return template
+
+
+@pytest.fixture
+def make_query_cache(request, query_cache_root, query_cache_template):
+    """Factory for query caches on this test's copy of the session template"""
+    from src.utils.query_cache import QueryCache
+    
+    persist_dir = query_cache_root / request.node.name
+    shutil.copytree(query_cache_template, persist_dir)
+    
+    def make(**kwargs):
+        return QueryCache(persist_directory=str(persist_dir), enabled=True, **kwargs)
+    
+    return make
@@ -0,0 +1,135 @@
+"""
+Embedding Service for the Agentic RAG Chatbot
+Runs a single embedding model instance shared by all web workers.
+
+Concurrent requests arriving within a short window are coalesced into one
+embedding call, so N Gunicorn workers don't each hold their own model
+and client.
+
+Usage:
+    python embedding_server.py
+Then set EMBEDDINGS_URL=http://127.0.0.1:8001 for the web app.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import List, Tuple
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from pydantic import BaseModel
+from langchain_openai import OpenAIEmbeddings
+
+# Load environment variables
+load_dotenv()
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+class EmbedResponse(BaseModel):
+    embeddings: List[List[float]]
+
+
+class MicroBatcher:
+    """Coalesces concurrent embedding requests into batched model calls"""
+    
+    def __init__(self, embeddings, window_ms: float = 15, max_batch_size: int = 256):
+        """
+        Initialize the micro-batcher
+        
+        Args:
+            embeddings: LangChain embeddings used for the batched calls
+            window_ms: How long to wait for more requests before embedding
+            max_batch_size: Stop collecting once this many texts are queued
+        """
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.queue: "asyncio.Queue[Tuple[List[str], asyncio.Future]]" = asyncio.Queue()
+    
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Queue texts for the next batch and wait for their embeddings"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+    
+    async def run(self):
+        """Collect queued requests for one window, embed them, fan out results"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            count = len(batch[0][0])
+            deadline = loop.time() + self.window
+            
+            while count < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                count += len(item[0])
+            
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await asyncio.to_thread(self.embeddings.embed_documents, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+batcher: MicroBatcher = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared model and start the batching loop"""
+    global batcher
+    model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    batcher = MicroBatcher(OpenAIEmbeddings(model=model))
+    task = asyncio.create_task(batcher.run())
+    yield
+    task.cancel()
+
+
+app = FastAPI(title="Agentic RAG Embedding Service", lifespan=lifespan)
+
+
+@app.post("/embed", response_model=EmbedResponse)
+async def embed(request: EmbedRequest):
+    """Embed a list of texts"""
+    if not request.texts:
+        return EmbedResponse(embeddings=[])
+    return EmbedResponse(embeddings=await batcher.embed(request.texts))
+
+
+@app.get("/health")
+async def health():
+    """Health check endpoint"""
+    return {"status": "healthy"}
+
+
+def main():
+    """Run the embedding service in a single process"""
+    import uvicorn
+    
+    host = os.getenv("EMBEDDINGS_HOST", "127.0.0.1")
+    port = int(os.getenv("EMBEDDINGS_PORT", 8001))
+    # One worker on purpose: the whole point is a single shared model
+    uvicorn.run("embedding_server:app", host=host, port=port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,9 +27,8 @@ def example_basic_usage():
         persist_directory="example_chroma_db"
     )
     
-    # 2. Load and index documents
-    documents = vector_store_manager.load_documents()
-    vectorstore = vector_store_manager.create_vectorstore(documents)
+    # 2. Open the index (documents are loaded and indexed on first run)
+    vectorstore = vector_store_manager.get_or_create_vectorstore()
     retriever = vector_store_manager.get_retriever()
     
     # 3. Create retrieval tool
@@ -112,8 +111,7 @@ def example_conversation_with_memory():
     
     # Initialize components
     vector_store_manager = VectorStoreManager(documents_dir="data/documents")
-    documents = vector_store_manager.load_documents()
-    vectorstore = vector_store_manager.create_vectorstore(documents)
+    vectorstore = vector_store_manager.get_or_create_vectorstore()
     retriever = vector_store_manager.get_retriever()
     
     retrieval_tool = RetrievalTool(retriever)
@@ -150,8 +148,7 @@ def example_similarity_search():
     
     # Initialize vector store
     vector_store_manager = VectorStoreManager(documents_dir="data/documents")
-    documents = vector_store_manager.load_documents()
-    vectorstore = vector_store_manager.create_vectorstore(documents)
+    vectorstore = vector_store_manager.get_or_create_vectorstore()
     
     # Perform direct similarity search
     print("\nSearching for: 'machine learning applications'")
@@ -165,6 +162,19 @@ def example_similarity_search():
         print(f"\n--- Result {i} ---")
         print(f"Content: {doc.page_content[:200]}...")
         print(f"Source: {doc.metadata.get('source', 'Unknown')}")
+    
+    # Search several phrasings at once (one embedding call, one index query)
+    queries = [
+        "machine learning applications",
+        "uses of machine learning",
+        "where is ML used in practice"
+    ]
+    print(f"\nBatch searching {len(queries)} queries...")
+    batch_results = vector_store_manager.similarity_search_batch(queries, k=3)
+    for query, docs in zip(queries, batch_results):
+        print(f"\n'{query}': {len(docs)} chunks")
+        for doc in docs:
+            print(f"  - {doc.metadata.get('source', 'Unknown')}")
 
 def main():
     """Run all examples"""
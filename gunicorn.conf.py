@@ -0,0 +1,40 @@
+"""
+Gunicorn configuration for the Agentic RAG Chatbot
+Serves the Flask app with gevent workers so requests waiting on OpenAI
+and ChromaDB I/O don't block each other.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+# Patch the standard library before the app (and the HTTP clients it uses)
+# is imported; Gunicorn loads this file first, so always start the server
+# through the gunicorn command (python app.py execs it)
+from gevent import monkey
+monkey.patch_all()
+
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Server socket (same settings as the development server)
+bind = f"{os.getenv('FLASK_HOST', '127.0.0.1')}:{os.getenv('PORT', '5000')}"
+
+# Worker processes
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gevent"
+worker_connections = 1000
+timeout = 120  # LLM calls with several tool iterations can be slow
+
+# Each worker builds its own chatbot (and API clients) after forking
+preload_app = False
+
+
+def post_fork(server, worker):
+    """Initialize the chatbot inside each worker process"""
+    # On an empty store the first worker indexes the documents while the
+    # others wait on its file lock (see VectorStoreManager._open_or_index)
+    from app import initialize_chatbot
+    initialize_chatbot()
@@ -3,12 +3,133 @@ Agentic RAG Agent
 An agent that uses reasoning and tools to answer questions using RAG
 """
 
-from typing import List, Optional
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+import asyncio
+import contextvars
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import cached_property, lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import httpx
+import tiktoken
+from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain.tools import Tool
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from src.utils.chat_history import HistoryFactory, in_memory_history_factory
+from src.utils.query_cache import QueryCache, canonicalize_query
+
+# One keep-alive connection pool for every agent in the process, so LLM calls
+# reuse TLS connections instead of each ChatOpenAI opening its own client
+_SHARED_HTTPX = httpx.Client(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+)
+
+# The system prompt and template are constant, so build them once at import
+SYSTEM_PROMPT = """You are a helpful AI assistant with access to a knowledge base.
+
+You can use the available tools to search for information and answer user questions accurately.
+
+When answering questions:
+1. Think step-by-step about what information you need
+2. Use the knowledge_base_search tool to find relevant information (search for
+   each part of a multi-part question separately)
+3. Synthesize the retrieved information to provide clear, accurate answers
+4. If you cannot find relevant information, say so honestly
+5. Maintain context from the conversation history
+
+Always be helpful, accurate, and concise in your responses."""
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    MessagesPlaceholder(variable_name="chat_history", optional=True),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad"),
+])
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model_name: str) -> tiktoken.Encoding:
+    """Tokenizer for a model (falls back to cl100k_base for unknown models)"""
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=8)
+def _system_prompt_tokens(model_name: str) -> Tuple[int, ...]:
+    """Token ids of the system prompt, encoded once per model"""
+    return tuple(_get_encoding(model_name).encode(SYSTEM_PROMPT))
+
+
+class _TokenQueueHandler(BaseCallbackHandler):
+    """Callback handler that forwards generated tokens to a queue (needs a streaming LLM)"""
+    
+    def __init__(self, tokens: "queue.Queue[Optional[str]]"):
+        self.tokens = tokens
+    
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        # Tool-calling steps stream empty content; only forward answer text
+        if token:
+            self.tokens.put(token)
+
+# Thread pool of the agent step currently being run by _ConcurrentToolExecutor
+_tool_pool: contextvars.ContextVar[Optional[ContextThreadPoolExecutor]] = contextvars.ContextVar(
+    "tool_pool", default=None
+)
+
+
+class _ConcurrentToolExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs the tool calls of one agent step concurrently
+    
+    The async path (ainvoke) already gathers them; this does the same for the
+    sync path with a thread pool, so wall time is the slowest call rather
+    than the sum of all of them.
+    """
+    
+    max_tool_concurrency: int = 1
+    
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        if self.max_tool_concurrency <= 1:
+            yield from super()._iter_next_step(
+                name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+            )
+            return
+        
+        # The base implementation yields every action before performing them
+        # one by one; submit each to the pool as it comes and collect results
+        # in order. ContextThreadPoolExecutor carries callbacks into the threads.
+        with ContextThreadPoolExecutor(max_workers=self.max_tool_concurrency) as pool:
+            steps = []
+            token = _tool_pool.set(pool)
+            try:
+                for output in super()._iter_next_step(
+                    name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+                ):
+                    if isinstance(output, Future):
+                        steps.append(output)
+                    else:
+                        yield output
+            finally:
+                _tool_pool.reset(token)
+            for step in steps:
+                yield step.result()
+    
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        pool = _tool_pool.get()
+        if pool is None:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        return pool.submit(
+            super()._perform_agent_action, name_to_tool_map, color_mapping, agent_action, run_manager
+        )
 
 
 class AgenticRAGAgent:
@@ -20,7 +141,13 @@ class AgenticRAGAgent:
         model_name: str = "gpt-3.5-turbo",
         temperature: float = 0.7,
         max_iterations: int = 10,
-        verbose: bool = True
+        verbose: bool = True,
+        query_cache: Optional[QueryCache] = None,
+        max_history_turns: int = 6,
+        max_prompt_tokens: Optional[int] = None,
+        history_factory: Optional[HistoryFactory] = None,
+        max_sessions: int = 1000,
+        max_tool_concurrency: int = 1
     ):
         """
         Initialize the agentic RAG agent
@@ -31,65 +158,72 @@ class AgenticRAGAgent:
             temperature: Temperature for generation
             max_iterations: Maximum reasoning iterations
             verbose: Whether to print agent reasoning
+            query_cache: Optional semantic cache for responses
+            max_history_turns: Number of recent exchanges kept in the prompt
+            max_prompt_tokens: Token budget for the system prompt plus history
+                (None to only limit the number of turns)
+            history_factory: Creates the message store for a session id
+                (see src/utils/chat_history.py); defaults to in-process
+            max_sessions: Number of session memories kept open at once
+            max_tool_concurrency: Tool calls from one agent step run at once
+                by chat() and chat_stream() (1 runs them one after another)
         """
         self.tools = tools
         self.model_name = model_name
         self.temperature = temperature
         self.max_iterations = max_iterations
         self.verbose = verbose
+        self.query_cache = query_cache
+        self.max_history_turns = max_history_turns
+        self.max_prompt_tokens = max_prompt_tokens
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            model=model_name,
-            temperature=temperature
-        )
+        self.history_factory = history_factory or in_memory_history_factory()
+        self.max_sessions = max_sessions
+        self.max_tool_concurrency = max_tool_concurrency
         
-        # Initialize memory
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
-        )
+        # Per-session memories; the messages themselves live in the history
+        # store, so evicting a memory here never loses a conversation
+        self._memories: "OrderedDict[str, ConversationBufferWindowMemory]" = OrderedDict()
+        self._memories_lock = threading.Lock()
         
-        # Create the agent
-        self.agent_executor = self._create_agent()
+        # Identical requests in flight share one agent run (singleflight).
+        # threading primitives are greenlet-safe once gevent patches them.
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._inflight_lock = threading.Lock()
+    
+    @cached_property
+    def llm(self) -> ChatOpenAI:
+        """LLM client, created on first use and backed by the shared connection pool"""
+        # streaming=True makes every call use the streaming API, so token
+        # callbacks (see chat_stream) fire as the answer is generated; a plain
+        # callback handler alone doesn't switch the model to streaming
+        return ChatOpenAI(
+            model=self.model_name,
+            temperature=self.temperature,
+            streaming=True,
+            http_client=_SHARED_HTTPX
+        )
+    
+    @cached_property
+    def agent_executor(self) -> AgentExecutor:
+        """Agent executor, built on first use"""
+        return self._create_agent()
     
     def _create_agent(self) -> AgentExecutor:
         """Create the agent with tools and reasoning capabilities"""
-        
-        # Define the system prompt for the agent
-        system_prompt = """You are a helpful AI assistant with access to a knowledge base.
-
-You can use the available tools to search for information and answer user questions accurately.
-
-When answering questions:
-1. Think step-by-step about what information you need
-2. Use the knowledge_base_search tool to find relevant information
-3. Synthesize the retrieved information to provide clear, accurate answers
-4. If you cannot find relevant information, say so honestly
-5. Maintain context from the conversation history
-
-Always be helpful, accurate, and concise in your responses."""
-
-        # Create the prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            MessagesPlaceholder(variable_name="chat_history", optional=True),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        # Create the agent
-        agent = create_openai_functions_agent(
+        # Create the agent (tool calling lets the model request several
+        # searches in one step; ainvoke runs them concurrently)
+        agent = create_openai_tools_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=prompt
+            prompt=PROMPT
         )
         
         # Create the agent executor
-        agent_executor = AgentExecutor(
+        agent_executor = _ConcurrentToolExecutor(
             agent=agent,
             tools=self.tools,
-            memory=self.memory,
+            max_tool_concurrency=self.max_tool_concurrency,
             verbose=self.verbose,
             max_iterations=self.max_iterations,
             handle_parsing_errors=True
@@ -97,34 +231,276 @@ Always be helpful, accurate, and concise in your responses."""
         
         return agent_executor
     
-    def chat(self, message: str) -> str:
+    def get_memory(self, session_id: str = "default") -> ConversationBufferWindowMemory:
+        """
+        Get the conversation memory for a session
+        
+        Args:
+            session_id: Conversation to load
+            
+        Returns:
+            Window memory backed by the session's history store
+        """
+        with self._memories_lock:
+            memory = self._memories.get(session_id)
+            if memory is not None:
+                self._memories.move_to_end(session_id)
+                return memory
+            
+            # Bounded so prompt size doesn't grow with the chat
+            memory = ConversationBufferWindowMemory(
+                chat_memory=self.history_factory(session_id),
+                k=self.max_history_turns,
+                memory_key="chat_history",
+                return_messages=True
+            )
+            self._memories[session_id] = memory
+            while len(self._memories) > self.max_sessions:
+                self._memories.popitem(last=False)
+            return memory
+    
+    @property
+    def memory(self) -> ConversationBufferWindowMemory:
+        """Memory of the default session"""
+        return self.get_memory()
+    
+    def _load_history(self, session_id: str) -> List[BaseMessage]:
+        """Recent messages of a session that fit in the prompt"""
+        messages = list(self.get_memory(session_id).load_memory_variables({})["chat_history"])
+        
+        if self.max_prompt_tokens is None:
+            return messages
+        
+        # The system prompt's token count is fixed, so only history is encoded
+        budget = self.max_prompt_tokens - len(_system_prompt_tokens(self.model_name))
+        encoding = _get_encoding(self.model_name)
+        total = sum(len(encoding.encode(msg.content)) for msg in messages)
+        while messages and total > budget:
+            # Drop the oldest exchange (user message and answer) as a unit
+            dropped = messages[:2]
+            del messages[:2]
+            total -= sum(len(encoding.encode(msg.content)) for msg in dropped)
+        return messages
+    
+    def _save_turn(self, session_id: str, message: str, output: str):
+        """Append an exchange to the session's history"""
+        memory = self.get_memory(session_id)
+        memory.save_context({"input": message}, {"output": output})
+        
+        # Drop stored messages that fall outside the window so histories
+        # don't grow without bound
+        history = memory.chat_memory
+        window = 2 * self.max_history_turns
+        if isinstance(history, InMemoryChatMessageHistory):
+            # Plain list: trim in place after every turn
+            excess = len(history.messages) - window
+            if excess > 0:
+                del history.messages[:excess]
+        else:
+            # Remote stores can't trim in place, so rewrite the history once it
+            # reaches twice the window (amortizing the rewrite over many turns)
+            messages = history.messages
+            if len(messages) >= 2 * window:
+                history.clear()
+                history.add_messages(messages[-window:])
+    
+    def _join_inflight(self, message: str, session_id: str) -> Tuple[Future, bool]:
+        """Return the shared future for a request and whether the caller runs it"""
+        key = (session_id, canonicalize_query(message))
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+    
+    def _finish_inflight(self, message: str, session_id: str):
+        """Forget a finished request so later identical messages run again"""
+        with self._inflight_lock:
+            self._inflight.pop((session_id, canonicalize_query(message)), None)
+    
+    def chat(self, message: str, session_id: str = "default") -> str:
         """
         Process a user message and return a response
         
+        Concurrent messages that canonicalize to the same query in the same
+        session share one agent run.
+        
+        Args:
+            message: User's message
+            session_id: Conversation the message belongs to (cache key)
+            
+        Returns:
+            Agent's response
+        """
+        future, leader = self._join_inflight(message, session_id)
+        if not leader:
+            return future.result()
+        
+        try:
+            response = self._chat(message, session_id)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._finish_inflight(message, session_id)
+    
+    def _chat(self, message: str, session_id: str) -> str:
+        """Run the cache lookup and agent for one message"""
+        try:
+            if self.query_cache is not None:
+                cached = self.query_cache.get(message, session_id=session_id)
+                if cached is not None:
+                    # Keep the conversation history consistent on a cache hit
+                    self._save_turn(session_id, message, cached)
+                    return cached
+            
+            response = self.agent_executor.invoke({
+                "input": message,
+                "chat_history": self._load_history(session_id)
+            })
+            output = response.get("output")
+            if output is None:
+                return "I apologize, but I couldn't generate a response."
+            self._save_turn(session_id, message, output)
+            
+            if self.query_cache is not None:
+                self.query_cache.set(message, output, session_id=session_id)
+            
+            return output
+        except Exception as e:
+            return f"Error processing message: {str(e)}"
+    
+    async def achat(self, message: str, session_id: str = "default") -> str:
+        """
+        Async version of chat(), awaiting the agent executor's ainvoke
+        
         Args:
             message: User's message
+            session_id: Conversation the message belongs to (cache key)
             
         Returns:
             Agent's response
         """
+        future, leader = self._join_inflight(message, session_id)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        
         try:
-            response = self.agent_executor.invoke({"input": message})
-            return response.get("output", "I apologize, but I couldn't generate a response.")
+            response = await self._achat(message, session_id)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._finish_inflight(message, session_id)
+    
+    async def _achat(self, message: str, session_id: str) -> str:
+        """Async cache lookup and agent run for one message"""
+        try:
+            if self.query_cache is not None:
+                cached = await self.query_cache.aget(message, session_id=session_id)
+                if cached is not None:
+                    # Keep the conversation history consistent on a cache hit
+                    await asyncio.to_thread(self._save_turn, session_id, message, cached)
+                    return cached
+            
+            # History stores may be remote (Redis/SQLite), so keep them off the loop
+            history = await asyncio.to_thread(self._load_history, session_id)
+            response = await self.agent_executor.ainvoke({
+                "input": message,
+                "chat_history": history
+            })
+            output = response.get("output")
+            if output is None:
+                return "I apologize, but I couldn't generate a response."
+            await asyncio.to_thread(self._save_turn, session_id, message, output)
+            
+            if self.query_cache is not None:
+                await self.query_cache.aset(message, output, session_id=session_id)
+            
+            return output
         except Exception as e:
             return f"Error processing message: {str(e)}"
     
-    def reset_memory(self):
-        """Clear the conversation history"""
-        self.memory.clear()
+    def chat_stream(self, message: str, session_id: str = "default") -> Iterator[str]:
+        """
+        Process a user message and yield the response as it is generated
+        
+        The agent runs in a background thread (a greenlet under gevent) while
+        tokens are yielded from a queue, so the first words reach the caller
+        long before the full answer is finished.
+        
+        Args:
+            message: User's message
+            session_id: Conversation the message belongs to (cache key)
+            
+        Yields:
+            Chunks of the agent's response
+        """
+        if self.query_cache is not None:
+            cached = self.query_cache.get(message, session_id=session_id)
+            if cached is not None:
+                self._save_turn(session_id, message, cached)
+                yield cached
+                return
+        
+        history = self._load_history(session_id)
+        tokens: "queue.Queue[Optional[str]]" = queue.Queue()
+        result: Dict[str, Any] = {}
+        
+        def run():
+            try:
+                result["response"] = self.agent_executor.invoke(
+                    {"input": message, "chat_history": history},
+                    config={"callbacks": [_TokenQueueHandler(tokens)]}
+                )
+            except Exception as e:
+                result["error"] = e
+            finally:
+                tokens.put(None)
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        
+        streamed = False
+        while (token := tokens.get()) is not None:
+            streamed = True
+            yield token
+        worker.join()
+        
+        if "error" in result:
+            yield f"Error processing message: {str(result['error'])}"
+            return
+        
+        output = result["response"].get("output")
+        if output is None:
+            yield "I apologize, but I couldn't generate a response."
+            return
+        self._save_turn(session_id, message, output)
+        if not streamed:
+            # The model didn't stream (e.g. a fake or non-streaming LLM)
+            yield output
+        
+        if self.query_cache is not None:
+            self.query_cache.set(message, output, session_id=session_id)
+    
+    def reset_memory(self, session_id: str = "default"):
+        """Clear the conversation history of a session"""
+        self.get_memory(session_id).clear()
     
-    def get_conversation_history(self) -> str:
-        """Get the conversation history as a string"""
+    def get_conversation_history(self, session_id: str = "default") -> str:
+        """Get the conversation history of a session as a string"""
         try:
-            messages = self.memory.chat_memory.messages
-            history = []
-            for msg in messages:
-                role = "User" if msg.type == "human" else "Assistant"
-                history.append(f"{role}: {msg.content}")
-            return "\n".join(history)
+            # Remote histories rebuild the message list on every access
+            messages = self.get_memory(session_id).chat_memory.messages
+            return "\n".join(
+                f"{'User' if msg.type == 'human' else 'Assistant'}: {msg.content}"
+                for msg in messages
+            )
         except Exception:
             return "No conversation history available."
@@ -3,24 +3,124 @@ Retrieval Tool
 Tool for retrieving relevant information from the knowledge base
 """
 
-from typing import Optional
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from langchain_core.documents import Document
 from langchain_core.tools import Tool
-from langchain_core.callbacks.manager import CallbackManagerForToolRun
+from langchain_core.callbacks.manager import (
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForToolRun
+)
 
 
 class RetrievalTool:
     """Tool for retrieving information from the vector store"""
     
-    def __init__(self, retriever, name: str = "knowledge_base_search"):
+    def __init__(
+        self,
+        retriever,
+        name: str = "knowledge_base_search",
+        batch_search: Optional[Callable[[List[str]], List[List[Document]]]] = None,
+        cache_size: int = 1024
+    ):
         """
         Initialize the retrieval tool
         
         Args:
             retriever: LangChain retriever object
             name: Name of the tool
+            batch_search: Optional function searching several queries at once
+                (e.g. VectorStoreManager.similarity_search_batch); enables
+                one-query-per-line input
+            cache_size: Number of recent retrievals kept in memory (0 to disable)
         """
         self.retriever = retriever
         self.name = name
+        self.batch_search = batch_search
+        self.cache_size = cache_size
+        
+        # LRU of recent results; the agent often repeats a search across the
+        # steps of one answer, and each repeat would re-embed the query
+        self._results: "OrderedDict[str, Tuple[Document, ...]]" = OrderedDict()
+        self._results_lock = threading.Lock()
+    
+    @staticmethod
+    def _cache_key(query: str) -> str:
+        """Normalize a query so trivially different spellings share a result"""
+        return " ".join(query.split()).lower()
+    
+    def _get_cached(self, query: str) -> Optional[List[Document]]:
+        """Return the cached documents for a query, if any"""
+        key = self._cache_key(query)
+        with self._results_lock:
+            docs = self._results.get(key)
+            if docs is None:
+                return None
+            self._results.move_to_end(key)
+        return list(docs)
+    
+    def _set_cached(self, query: str, docs: List[Document]):
+        """Store the documents retrieved for a query"""
+        if self.cache_size <= 0:
+            return
+        key = self._cache_key(query)
+        with self._results_lock:
+            self._results[key] = tuple(docs)
+            self._results.move_to_end(key)
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+    
+    def clear_cache(self):
+        """Forget cached results (call after the knowledge base changes)"""
+        with self._results_lock:
+            self._results.clear()
+    
+    def _retrieve(self, query: str) -> List[Document]:
+        """Retrieve documents for a query, reusing recent results"""
+        docs = self._get_cached(query)
+        if docs is None:
+            docs = self.retriever.invoke(query)
+            self._set_cached(query, docs)
+        return docs
+    
+    async def _aretrieve(self, query: str) -> List[Document]:
+        """Async version of _retrieve"""
+        docs = self._get_cached(query)
+        if docs is None:
+            docs = await self.retriever.ainvoke(query)
+            self._set_cached(query, docs)
+        return docs
+    
+    def _format_results(self, docs: List[Document]) -> str:
+        """Format retrieved documents for the agent"""
+        if not docs:
+            return "No relevant information found in the knowledge base."
+        
+        # Format the results (collected in a list and joined once)
+        parts = ["Retrieved Information:\n\n"]
+        for i, doc in enumerate(docs, 1):
+            parts.append(f"[Document {i}]\n{doc.page_content}\n")
+            if doc.metadata:
+                parts.append(f"Source: {doc.metadata.get('source', 'Unknown')}\n")
+            parts.append("\n")
+        
+        return "".join(parts).strip()
+    
+    def _split_queries(self, query: str) -> List[str]:
+        """Split one-query-per-line input when batched search is available"""
+        if self.batch_search is None:
+            return [query]
+        queries = [line.strip() for line in query.splitlines() if line.strip()]
+        return queries or [query]
+    
+    def _format_batch_results(self, queries: List[str], results: List[List[Document]]) -> str:
+        """Format the results of a batched search, grouped by query"""
+        return "\n\n".join(
+            f'Results for "{query}":\n{self._format_results(docs)}'
+            for query, docs in zip(queries, results)
+        )
     
     def _search(self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None) -> str:
         """
@@ -34,33 +134,61 @@ class RetrievalTool:
             Formatted string with retrieved documents
         """
         try:
-            docs = self.retriever.get_relevant_documents(query)
+            queries = self._split_queries(query)
+            if len(queries) > 1:
+                return self._format_batch_results(queries, self.batch_search(queries))
             
-            if not docs:
-                return "No relevant information found in the knowledge base."
+            docs = self._retrieve(query)
+            return self._format_results(docs)
+        except Exception as e:
+            return f"Error retrieving information: {str(e)}"
+    
+    async def _asearch(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> str:
+        """
+        Async version of _search, so several searches requested in one
+        agent step can run concurrently
+        
+        Args:
+            query: The search query
+            run_manager: Callback manager
             
-            # Format the results
-            result = "Retrieved Information:\n\n"
-            for i, doc in enumerate(docs, 1):
-                result += f"[Document {i}]\n"
-                result += f"{doc.page_content}\n"
-                if doc.metadata:
-                    result += f"Source: {doc.metadata.get('source', 'Unknown')}\n"
-                result += "\n"
+        Returns:
+            Formatted string with retrieved documents
+        """
+        try:
+            queries = self._split_queries(query)
+            if len(queries) > 1:
+                results = await asyncio.to_thread(self.batch_search, queries)
+                return self._format_batch_results(queries, results)
             
-            return result.strip()
+            docs = await self._aretrieve(query)
+            return self._format_results(docs)
         except Exception as e:
             return f"Error retrieving information: {str(e)}"
     
     def as_tool(self) -> Tool:
         """Convert to LangChain Tool"""
+        description = (
+            "Search the knowledge base for relevant information. "
+            "Use this tool when you need to find specific information "
+            "from documents to answer user questions. "
+            "Input should be a search query string. "
+        )
+        if self.batch_search is not None:
+            description += (
+                "For questions with several parts, put one query per line "
+                "to search for all of them at once."
+            )
+        else:
+            description += "For questions with several parts, call it once per part."
+        
         return Tool(
             name=self.name,
             func=self._search,
-            description=(
-                "Search the knowledge base for relevant information. "
-                "Use this tool when you need to find specific information "
-                "from documents to answer user questions. "
-                "Input should be a search query string."
-            )
+            coroutine=self._asearch,
+            description=description
         )
@@ -0,0 +1,59 @@
+"""
+Chat History
+Factories for per-session conversation storage shared across worker processes
+"""
+
+from typing import Callable, Optional
+from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+
+HistoryFactory = Callable[[str], BaseChatMessageHistory]
+
+
+def in_memory_history_factory() -> HistoryFactory:
+    """
+    Keep each session's history in this process
+    
+    Only suitable for a single process (the CLI or the development server);
+    with several Gunicorn workers each one would see a different history.
+    """
+    histories = {}
+    
+    def factory(session_id: str) -> BaseChatMessageHistory:
+        return histories.setdefault(session_id, InMemoryChatMessageHistory())
+    
+    return factory
+
+
+def redis_history_factory(redis_url: str, ttl: Optional[int] = None) -> HistoryFactory:
+    """
+    Store each session's history in Redis (requires the redis package)
+    
+    Args:
+        redis_url: Redis connection URL (e.g. redis://localhost:6379/0)
+        ttl: Expire a session's history after this many seconds of inactivity
+    """
+    from langchain_community.chat_message_histories import RedisChatMessageHistory
+    
+    def factory(session_id: str) -> BaseChatMessageHistory:
+        return RedisChatMessageHistory(session_id=session_id, url=redis_url, ttl=ttl)
+    
+    return factory
+
+
+def sqlite_history_factory(db_path: str = "chat_history.sqlite") -> HistoryFactory:
+    """
+    Store each session's history in a SQLite file shared by all local workers
+    
+    Args:
+        db_path: Path of the SQLite database file
+    """
+    from sqlalchemy import create_engine
+    from langchain_community.chat_message_histories import SQLChatMessageHistory
+    
+    # One engine (and connection pool) for every session
+    engine = create_engine(f"sqlite:///{db_path}")
+    
+    def factory(session_id: str) -> BaseChatMessageHistory:
+        return SQLChatMessageHistory(session_id=session_id, connection=engine)
+    
+    return factory
@@ -0,0 +1,311 @@
+"""
+Embedding Cache
+Persistent cache for document embeddings keyed by a SHA-256 of the text
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from src.utils.remote_embeddings import RemoteEmbeddings
+from src.utils.text import canonicalize_query
+
+
+class EmbeddingCache(Embeddings):
+    """Wraps an embeddings model and stores document vectors in SQLite"""
+    
+    # SQLite limits the number of parameters in a single statement
+    _QUERY_BATCH = 500
+    
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_path: str = "embedding_cache.sqlite",
+        namespace: str = "",
+        max_entries: int = 100_000,
+        ttl: Optional[float] = 30 * 24 * 3600,
+        batch_size: int = 512,
+        max_batch_tokens: int = 200_000,
+        max_workers: int = 8,
+        query_cache_size: int = 8192
+    ):
+        """
+        Initialize the embedding cache
+        
+        Args:
+            embeddings: Embeddings model used for cache misses
+            cache_path: Path of the SQLite cache file
+            namespace: Prefix mixed into every key (e.g. the model name) so
+                vectors from different models never collide
+            max_entries: Maximum number of cached vectors (least recently
+                used entries are evicted first)
+            ttl: Time-to-live for cached vectors in seconds (None to disable)
+            batch_size: Maximum number of texts sent in one embedding request
+            max_batch_tokens: Maximum number of tokens sent in one embedding
+                request (keeps large batches under the API's token limits)
+            max_workers: Maximum number of embedding requests in flight
+            query_cache_size: Number of query embeddings kept in memory
+        """
+        self.embeddings = embeddings
+        self.cache_path = cache_path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_workers = max_workers
+        self.query_cache_size = query_cache_size
+        
+        # In-process LRU for query embeddings (repeated retrieval queries);
+        # float32 arrays take a fifth of the memory of lists of floats
+        self._query_vectors: "OrderedDict[str, array]" = OrderedDict()
+        self._query_lock = threading.Lock()
+        
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_accessed "
+                "ON embeddings (accessed)"
+            )
+    
+    def _key(self, text: str) -> str:
+        """Cache key for a text"""
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+    
+    def _lookup(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Fetch unexpired vectors for the given keys and mark them as used"""
+        keys = list(keys)
+        now = time.time()
+        found = {}
+        
+        with self._lock, self._conn:
+            for start in range(0, len(keys), self._QUERY_BATCH):
+                batch = keys[start:start + self._QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, created FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob, created in rows:
+                    if self.ttl is not None and now - created > self.ttl:
+                        continue
+                    found[key] = array("f", blob).tolist()
+            
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+        
+        return found
+    
+    def _store(self, vectors: Dict[str, List[float]]):
+        """Write vectors to the cache and evict the least recently used overflow"""
+        now = time.time()
+        
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now, now) for key, vector in vectors.items()]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+    
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into requests capped by text count and token count"""
+        batches = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            # A token is at least one byte, so the UTF-8 length is an upper
+            # bound on the token count that needs no tokenizer
+            tokens = len(text.encode("utf-8"))
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the model in large batches sent concurrently"""
+        batches = self._batches(texts)
+        if len(batches) <= 1:
+            return self.embeddings.embed_documents(texts)
+        
+        # Embedding requests are network-bound, so threads overlap them well
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            results = executor.map(self.embeddings.embed_documents, batches)
+            return [vector for batch in results for vector in batch]
+    
+    def embed_documents_cached(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, only calling the model for texts not already cached
+        
+        Args:
+            texts: Texts to embed
+        
+        Returns:
+            Embeddings in the same order as the input texts
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = self._lookup(set(keys))
+        
+        # Deduplicate misses so repeated chunks are only embedded once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        
+        hits = sum(1 for key in keys if key not in missing)
+        
+        if missing:
+            new_vectors = dict(zip(missing, self._embed_uncached(list(missing.values()))))
+            self._store(new_vectors)
+            vectors.update(new_vectors)
+        
+        print(f"Embedding cache: {hits} hits, {len(missing)} misses")
+        return [vectors[key] for key in keys]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents through the cache"""
+        return self.embed_documents_cached(texts)
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries, reusing recent query embeddings held in memory
+        
+        Queries are matched by their canonical form (see canonicalize_query),
+        the same key the query cache uses, so the embedding computed for a
+        cache lookup is reused when the agent then searches for the same
+        question. All queries not already in memory are embedded in a
+        single call.
+        
+        Args:
+            texts: Queries to embed
+        
+        Returns:
+            Embeddings in the same order as the input queries
+        """
+        keys = [self._key(canonicalize_query(text)) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        
+        with self._query_lock:
+            for key in keys:
+                vector = self._query_vectors.get(key)
+                if vector is not None:
+                    self._query_vectors.move_to_end(key)
+                    vectors[key] = vector.tolist()
+        
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        
+        if missing:
+            if len(missing) == 1:
+                new_vectors = [self.embeddings.embed_query(next(iter(missing.values())))]
+            else:
+                new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            vectors.update(zip(missing, new_vectors))
+            
+            with self._query_lock:
+                for key in missing:
+                    self._query_vectors[key] = array("f", vectors[key])
+                    self._query_vectors.move_to_end(key)
+                while len(self._query_vectors) > self.query_cache_size:
+                    self._query_vectors.popitem(last=False)
+        
+        return [vectors[key] for key in keys]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing recent query embeddings held in memory"""
+        return self.embed_queries([text])[0]
+
+
+def get_cached_embeddings(
+    embedding_model: str = "text-embedding-ada-002",
+    embeddings_url: Optional[str] = None,
+    cache_path: str = "embedding_cache.sqlite"
+) -> EmbeddingCache:
+    """
+    Get the process-wide cached embedding function for a model
+    
+    Callers asking for the same model, service and cache file share one
+    instance (and so one API client and one query embedding LRU).
+    
+    Args:
+        embedding_model: OpenAI embedding model to use
+        embeddings_url: URL of a shared embedding service to use instead
+        cache_path: Path of the SQLite cache file
+    """
+    # Normalize the arguments so every call style maps to the same instance
+    return _create_cached_embeddings(embedding_model, embeddings_url or None, os.path.abspath(cache_path))
+
+
+@lru_cache(maxsize=4)
+def _create_cached_embeddings(
+    embedding_model: str,
+    embeddings_url: Optional[str],
+    cache_path: str
+) -> EmbeddingCache:
+    """Create (once per process) the cached embedding function for a model"""
+    if embeddings_url:
+        base_embeddings = RemoteEmbeddings(url=embeddings_url)
+    else:
+        base_embeddings = OpenAIEmbeddings(model=embedding_model)
+    return EmbeddingCache(base_embeddings, cache_path=cache_path, namespace=embedding_model)
+
+
+def get_local_embeddings(
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    cache_path: str = "embedding_cache.sqlite"
+) -> EmbeddingCache:
+    """
+    Get the process-wide cached local embedding function for a model
+    
+    Embeds on the CPU with sentence-transformers (requires the
+    sentence-transformers package), so no network call is needed.
+    
+    Args:
+        model_name: sentence-transformers model to use
+        cache_path: Path of the SQLite cache file
+    """
+    return _create_local_embeddings(model_name, os.path.abspath(cache_path))
+
+
+@lru_cache(maxsize=2)
+def _create_local_embeddings(model_name: str, cache_path: str) -> EmbeddingCache:
+    """Load (once per process) a local embedding model"""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    
+    base_embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": 32}
+    )
+    return EmbeddingCache(base_embeddings, cache_path=cache_path, namespace=model_name)
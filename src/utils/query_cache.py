@@ -0,0 +1,417 @@
+"""
+Query Cache
+Semantic cache for agent responses using embeddings, an in-memory HNSW
+index for lookups and ChromaDB for durable storage
+"""
+
+import asyncio
+import atexit
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+import hnswlib  # chroma-hnswlib, the build chromadb 0.5 uses
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from src.utils.embedding_cache import get_cached_embeddings, get_local_embeddings
+from src.utils.text import canonicalize_query
+
+
+def _now() -> float:
+    """Current time for timestamps and TTL checks (patched in tests)"""
+    return time.time()
+
+
+class QueryCache:
+    """Caches agent responses and serves them for semantically similar queries"""
+    
+    # HNSW parameters for the in-memory lookup index, tuned for speed: only
+    # the single nearest neighbour is needed and it must be very close to
+    # count as a hit, so a sparse graph and a small search list suffice
+    INDEX_INITIAL_CAPACITY = 1024
+    INDEX_M = 8
+    INDEX_EF_CONSTRUCTION = 100
+    INDEX_EF_SEARCH = 10
+    
+    # New entries are written to the store in batches, at the latest
+    # WRITE_FLUSH_INTERVAL seconds after the first one is buffered; lookups
+    # in this process see them at once through the in-memory layers
+    WRITE_BATCH_SIZE = 32
+    WRITE_FLUSH_INTERVAL = 5.0
+    
+    def __init__(
+        self,
+        persist_directory: str = "query_cache_db",
+        embedding_model: str = "text-embedding-ada-002",
+        embeddings_url: Optional[str] = None,
+        local_embedding_model: Optional[str] = None,
+        similarity_threshold: float = 0.92,
+        cache_ttl: int = 3600,
+        enabled: bool = True,
+        max_memory_entries: int = 10_000
+    ):
+        """
+        Initialize the query cache
+        
+        Args:
+            persist_directory: Directory to persist the cache store
+            embedding_model: OpenAI embedding model to use
+            embeddings_url: URL of a shared embedding service, if used
+            local_embedding_model: sentence-transformers model (e.g.
+                "sentence-transformers/all-MiniLM-L6-v2") used for lookups
+                instead of embedding_model, so a lookup needs no network
+                call; similarities differ between models, so lower
+                similarity_threshold to match (around 0.87 for MiniLM)
+            similarity_threshold: Minimum cosine similarity for a cache hit
+            cache_ttl: Time-to-live for cached responses in seconds
+            enabled: Whether caching is enabled
+            max_memory_entries: Number of responses also kept in process for
+                repeated queries (served without touching the store)
+        """
+        self.persist_directory = persist_directory
+        self.embedding_model = embedding_model
+        self.embeddings_url = embeddings_url
+        self.local_embedding_model = local_embedding_model
+        self.similarity_threshold = similarity_threshold
+        self.cache_ttl = cache_ttl
+        self.enabled = enabled
+        self.max_memory_entries = max_memory_entries
+        self.cache_store: Optional[Chroma] = None
+        
+        # In-process LRU of (response, timestamp) by session + canonical query
+        self._exact: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._exact_lock = threading.Lock()
+        
+        # In-memory HNSW index over all cached queries; label i -> _entries[i].
+        # Expired entries are marked deleted and their labels reused.
+        self._index: Optional[hnswlib.Index] = None
+        self._entries: List[Optional[dict]] = []
+        self._free_labels: List[int] = []
+        self._index_lock = threading.Lock()
+        
+        # Entries waiting to be written to the store: (id, vector, key, metadata)
+        self._pending: List[Tuple[str, List[float], str, dict]] = []
+        self._flush_timer: Optional[threading.Timer] = None
+        self._pending_lock = threading.Lock()
+        
+        if self.enabled:
+            self._initialize_cache()
+            atexit.register(self.flush)
+    
+    def _initialize_cache(self):
+        """Open (or create) the persistent cache store"""
+        cache_dir = os.path.dirname(os.path.abspath(self.persist_directory))
+        cache_path = os.path.join(cache_dir, "embedding_cache.sqlite")
+        if self.local_embedding_model:
+            self.embeddings = get_local_embeddings(self.local_embedding_model, cache_path)
+            # Vectors from another model (and dimension) get their own collection
+            digest = hashlib.sha256(self.local_embedding_model.encode("utf-8")).hexdigest()
+            collection_name = f"query_cache_{digest[:8]}"
+        else:
+            # Shares the vector store's embedding function (and its query
+            # embedding LRU) when both live in the same directory
+            self.embeddings = get_cached_embeddings(
+                self.embedding_model,
+                embeddings_url=self.embeddings_url,
+                cache_path=cache_path
+            )
+            collection_name = "query_cache"
+        self.cache_store = Chroma(
+            collection_name=collection_name,
+            persist_directory=self.persist_directory,
+            embedding_function=self.embeddings,
+            # Same metric as the in-memory index
+            collection_metadata={"hnsw:space": "cosine"}
+        )
+        self._load_index()
+    
+    def _load_index(self):
+        """
+        Build the in-memory index from the persisted entries
+        
+        Chroma is only used for durable storage; lookups go to this index.
+        Entries written by other processes are picked up on the next load.
+        Expired entries are left out and deleted from the store.
+        """
+        with self._index_lock:
+            self._index = None
+            self._entries = []
+            self._free_labels = []
+        
+        self._delete_expired()
+        data = self.cache_store._collection.get(include=["embeddings", "metadatas"])
+        if data["embeddings"] is not None and len(data["embeddings"]) > 0:
+            fresh = [i for i, metadata in enumerate(data["metadatas"]) if self._is_fresh(metadata)]
+            if fresh:
+                self._index_add(
+                    [data["embeddings"][i] for i in fresh],
+                    [data["metadatas"][i] for i in fresh]
+                )
+    
+    def _index_add(self, vectors: Sequence[Sequence[float]], metadatas: Sequence[dict]):
+        """Add vectors (and their entries) to the in-memory index"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        
+        with self._index_lock:
+            if self._index is None:
+                self._index = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+                self._index.init_index(
+                    max_elements=max(self.INDEX_INITIAL_CAPACITY, len(vectors)),
+                    ef_construction=self.INDEX_EF_CONSTRUCTION,
+                    M=self.INDEX_M
+                )
+                self._index.set_ef(self.INDEX_EF_SEARCH)
+            
+            # Labels of expired entries come first; adding a deleted label
+            # overwrites its vector in place
+            reused = self._free_labels[:len(vectors)]
+            del self._free_labels[:len(reused)]
+            needed = len(self._entries) + len(vectors) - len(reused)
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+            
+            labels = reused + list(range(len(self._entries), needed))
+            self._index.add_items(vectors, np.asarray(labels))
+            self._entries.extend([None] * (needed - len(self._entries)))
+            for label, metadata in zip(labels, metadatas):
+                self._entries[label] = metadata
+    
+    def _prune_expired(self):
+        """Drop expired entries from the in-memory index and the store"""
+        with self._index_lock:
+            if self._index is not None:
+                for label, metadata in enumerate(self._entries):
+                    if metadata is not None and not self._is_fresh(metadata):
+                        self._index.mark_deleted(label)
+                        self._entries[label] = None
+                        self._free_labels.append(label)
+        self._delete_expired()
+    
+    def _delete_expired(self):
+        """Delete expired entries from the store"""
+        self.cache_store._collection.delete(where={"timestamp": {"$lt": _now() - self.cache_ttl}})
+    
+    def _index_search(self, vector: Sequence[float], session_id: str) -> Optional[Tuple[dict, float]]:
+        """Find the most similar fresh cached query in a session and its cosine similarity"""
+        with self._index_lock:
+            if self._index is None:
+                return None
+            entries = self._entries
+            
+            # Expired entries are skipped during the search, so a stale
+            # neighbour can't hide a fresh one that is close enough
+            def allowed(label: int) -> bool:
+                metadata = entries[label]
+                return (
+                    metadata is not None
+                    and metadata.get("session_id") == session_id
+                    and self._is_fresh(metadata)
+                )
+            
+            try:
+                labels, distances = self._index.knn_query(
+                    np.asarray([vector], dtype=np.float32),
+                    k=1,
+                    filter=allowed
+                )
+            except RuntimeError:
+                # No fresh entries for this session
+                return None
+        
+        # hnswlib's cosine distance is 1 - cosine similarity
+        return entries[int(labels[0][0])], 1.0 - float(distances[0][0])
+    
+    def _is_fresh(self, metadata: dict) -> bool:
+        """Whether a cached entry is still within its TTL"""
+        return _now() - metadata.get("timestamp", 0) <= self.cache_ttl
+    
+    @staticmethod
+    def _memory_key(key: str, session_id: str) -> str:
+        """In-process cache key for a canonical query in a session"""
+        return hashlib.sha256(f"{session_id}\0{key}".encode("utf-8")).hexdigest()
+    
+    def _get_memory(self, key: str, session_id: str) -> Optional[str]:
+        """Look up a response held in process"""
+        memory_key = self._memory_key(key, session_id)
+        with self._exact_lock:
+            entry = self._exact.get(memory_key)
+            if entry is None:
+                return None
+            response, timestamp = entry
+            if _now() - timestamp > self.cache_ttl:
+                del self._exact[memory_key]
+                return None
+            self._exact.move_to_end(memory_key)
+            return response
+    
+    def _set_memory(self, key: str, session_id: str, response: str, timestamp: float):
+        """Hold a response in process, evicting the least recently used"""
+        memory_key = self._memory_key(key, session_id)
+        with self._exact_lock:
+            self._exact[memory_key] = (response, timestamp)
+            self._exact.move_to_end(memory_key)
+            while len(self._exact) > self.max_memory_entries:
+                self._exact.popitem(last=False)
+    
+    def _get_exact(self, key: str, session_id: str) -> Optional[dict]:
+        """Look up the newest entry stored under the same canonical query"""
+        results = self.cache_store.get(
+            where={"$and": [{"session_id": session_id}, {"key": key}]},
+            include=["metadatas"]
+        )
+        fresh = [m for m in results["metadatas"] if self._is_fresh(m)]
+        if not fresh:
+            return None
+        return max(fresh, key=lambda m: m.get("timestamp", 0))
+    
+    def get(self, query: str, session_id: str = "default") -> Optional[str]:
+        """
+        Look up a cached response for a query
+        
+        Repeated queries are answered from memory; queries with the same
+        canonical form (see canonicalize_query) hit the store without an
+        embedding call; otherwise the most similar cached query is used if
+        it is close enough.
+        
+        Args:
+            query: The user's query
+            session_id: Conversation the query belongs to
+        
+        Returns:
+            The cached response, or None on a cache miss
+        """
+        if not self.enabled or self.cache_store is None:
+            return None
+        
+        try:
+            key = canonicalize_query(query)
+            response = self._get_memory(key, session_id)
+            if response is not None:
+                return response
+            
+            metadata = self._get_exact(key, session_id)
+            if metadata is not None:
+                self._set_memory(key, session_id, metadata["response"], metadata["timestamp"])
+                return metadata["response"]
+            
+            # Embed once through the shared cache, then search in memory
+            vector = self.embeddings.embed_query(key)
+            result = self._index_search(vector, session_id)
+            if result is None:
+                return None
+            
+            metadata, similarity = result
+            if similarity < self.similarity_threshold:
+                return None
+            
+            response = metadata.get("response")
+            self._set_memory(key, session_id, response, metadata["timestamp"])
+            return response
+        except Exception as e:
+            print(f"Error reading from query cache: {e}")
+            return None
+    
+    async def aget(self, query: str, session_id: str = "default") -> Optional[str]:
+        """
+        Async version of get()
+        
+        Repeated queries are answered from memory on the event loop; other
+        lookups (store reads, embedding calls) run in a worker thread.
+        """
+        if not self.enabled or self.cache_store is None:
+            return None
+        
+        response = self._get_memory(canonicalize_query(query), session_id)
+        if response is not None:
+            return response
+        return await asyncio.to_thread(self.get, query, session_id)
+    
+    def set(self, query: str, response: str, session_id: str = "default"):
+        """
+        Store a response for a query
+        
+        Args:
+            query: The user's query
+            response: The agent's response
+            session_id: Conversation the query belongs to
+        """
+        if not self.enabled or self.cache_store is None:
+            return
+        
+        try:
+            key = canonicalize_query(query)
+            timestamp = _now()
+            self._set_memory(key, session_id, response, timestamp)
+            metadata = {
+                "key": key,
+                "response": response,
+                "session_id": session_id,
+                "timestamp": timestamp,
+            }
+            # Usually served from the query embedding LRU (get() just embedded it)
+            vector = self.embeddings.embed_query(key)
+            self._index_add([vector], [metadata])
+            
+            with self._pending_lock:
+                self._pending.append((uuid.uuid4().hex, vector, key, metadata))
+                due = len(self._pending) >= self.WRITE_BATCH_SIZE
+                if not due and self._flush_timer is None:
+                    # Other workers only see the entry once it is stored, so
+                    # don't leave a lone entry waiting for the next set()
+                    self._flush_timer = threading.Timer(self.WRITE_FLUSH_INTERVAL, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+            if due:
+                self.flush()
+        except Exception as e:
+            print(f"Error writing to query cache: {e}")
+    
+    async def aset(self, query: str, response: str, session_id: str = "default"):
+        """Async version of set(), run in a worker thread"""
+        if not self.enabled or self.cache_store is None:
+            return
+        await asyncio.to_thread(self.set, query, response, session_id)
+    
+    def flush(self):
+        """Write buffered entries to the store in a single call"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+            self._cancel_flush_timer()
+        
+        if not pending or self.cache_store is None:
+            return
+        
+        ids, vectors, keys, metadatas = zip(*pending)
+        try:
+            self.cache_store._collection.add(
+                ids=list(ids),
+                embeddings=list(vectors),
+                documents=list(keys),
+                metadatas=list(metadatas)
+            )
+            # Writes are what grow the cache, so expired entries go here
+            self._prune_expired()
+        except Exception as e:
+            print(f"Error writing to query cache: {e}")
+    
+    def _cancel_flush_timer(self):
+        """Stop the scheduled flush, if any (call with _pending_lock held)"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+    
+    def clear(self):
+        """Remove all cached responses"""
+        if not self.enabled or self.cache_store is None:
+            return
+        
+        with self._exact_lock:
+            self._exact.clear()
+        with self._pending_lock:
+            self._pending.clear()
+            self._cancel_flush_timer()
+        self.cache_store.delete_collection()
+        self._initialize_cache()
@@ -0,0 +1,41 @@
+"""
+Remote Embeddings
+LangChain embeddings client for the shared embedding service (embedding_server.py)
+"""
+
+from typing import List
+import requests
+from langchain_core.embeddings import Embeddings
+
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings computed by a separate embedding service over HTTP"""
+    
+    def __init__(self, url: str, timeout: float = 60.0):
+        """
+        Initialize the remote embeddings client
+        
+        Args:
+            url: Base URL of the embedding service (e.g. http://127.0.0.1:8001)
+            timeout: Request timeout in seconds
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts with a single request"""
+        if not texts:
+            return []
+        
+        response = self.session.post(
+            f"{self.url}/embed",
+            json={"texts": texts},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query"""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,20 @@
+"""
+Text Normalization
+Canonical query forms shared by the response and embedding caches
+"""
+
+import unicodedata
+
+# Trailing punctuation that doesn't change what is being asked
+_TRAILING_PUNCTUATION = "?!.,;: "
+
+
+def canonicalize_query(query: str) -> str:
+    """
+    Canonical form of a query used as a cache key
+    
+    Normalizes Unicode (NFC), lowercases, collapses whitespace and strips
+    trailing punctuation, so "What is RAG?" and "what is  rag" share a key.
+    """
+    query = unicodedata.normalize("NFC", query).lower()
+    return " ".join(query.split()).rstrip(_TRAILING_PUNCTUATION)
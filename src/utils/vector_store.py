@@ -1,12 +1,16 @@
 """
 Vector Store Manager
-Handles document loading, embedding, and vector storage using ChromaDB
+Handles document loading, embedding, and vector storage using ChromaDB or FAISS
 """
 
 import os
-from typing import List, Optional
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
+from typing import Callable, Iterator, List, Literal, Optional
+import numpy as np
 from langchain_community.document_loaders import (
-    DirectoryLoader, 
     TextLoader,
     PyPDFLoader,
     UnstructuredMarkdownLoader,
@@ -14,21 +18,96 @@ from langchain_community.document_loaders import (
     UnstructuredWordDocumentLoader
 )
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
+from langchain_community.vectorstores import Chroma, FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from src.utils.embedding_cache import EmbeddingCache, get_cached_embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows (no Gunicorn workers to coordinate there)
+    fcntl = None
+
+
+@lru_cache(maxsize=4)
+def _open_vectorstore(persist_directory: str, embeddings: EmbeddingCache) -> Chroma:
+    """Open (once per process) the persisted Chroma store in a directory"""
+    return Chroma(
+        persist_directory=persist_directory,
+        embedding_function=embeddings
+    )
+
+
+# Exact inner-product search (IndexFlatIP); OpenAI embeddings are unit
+# length, so this ranks by cosine similarity
+FAISS_KWARGS = {"distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT}
+
+
+@lru_cache(maxsize=4)
+def _load_faiss(persist_directory: str, embeddings: EmbeddingCache) -> FAISS:
+    """Load (once per process) a FAISS index saved in a directory"""
+    return FAISS.load_local(
+        persist_directory,
+        embeddings,
+        allow_dangerous_deserialization=True,  # Pickle written by this app
+        **FAISS_KWARGS
+    )
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive lock on a file, blocking other processes (and threads) taking it"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Loader for each supported file extension
+LOADER_BY_EXT = {
+    ".txt": TextLoader,
+    ".md": UnstructuredMarkdownLoader,
+    ".csv": CSVLoader,
+    ".pdf": PyPDFLoader,
+    ".docx": UnstructuredWordDocumentLoader,
+}
+
+
+def _walk_files(directory: str) -> Iterator[str]:
+    """Yield the paths of all non-hidden files under a directory (one scan)"""
+    for entry in os.scandir(directory):
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_files(entry.path)
+        elif entry.is_file():
+            yield entry.path
 
 
 class VectorStoreManager:
     """Manages document ingestion and vector storage"""
     
+    # Chunks written to Chroma per call (below Chroma's max batch size)
+    INDEX_BATCH_SIZE = 4096
+    
+    # Above this many chunks, exact FAISS search loses to Chroma's HNSW index
+    FAISS_MAX_CHUNKS = 100_000
+    
     def __init__(
         self,
         documents_dir: str = "data/documents",
         persist_directory: str = "chroma_db",
         embedding_model: str = "text-embedding-ada-002",
-        chunk_size: int = 1000,
-        chunk_overlap: int = 200
+        chunk_size: int = 512,
+        chunk_overlap: int = 64,
+        embeddings_url: Optional[str] = None,
+        backend: Literal["chroma", "faiss"] = "chroma"
     ):
         """
         Initialize the vector store manager
@@ -37,18 +116,44 @@ class VectorStoreManager:
             documents_dir: Directory containing documents to load
             persist_directory: Directory to persist the vector store
             embedding_model: OpenAI embedding model to use
-            chunk_size: Size of text chunks for splitting
-            chunk_overlap: Overlap between chunks
+            chunk_size: Size of text chunks for splitting, in tokens
+            chunk_overlap: Overlap between chunks, in tokens
+            embeddings_url: URL of a shared embedding service; when set it
+                is used instead of calling OpenAI from this process
+            backend: "chroma" (HNSW index) or "faiss" (exact IndexFlatIP
+                search, faster for corpora under ~100k chunks)
         """
+        if backend not in ("chroma", "faiss"):
+            raise ValueError(f"Unknown vector store backend: {backend}")
+        
         self.documents_dir = documents_dir
         self.persist_directory = persist_directory
-        self.embeddings = OpenAIEmbeddings(model=embedding_model)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
+        self.backend = backend
+        
+        # Cache document vectors next to the vector store so rebuilding the
+        # index only embeds chunks whose text changed
+        cache_dir = os.path.dirname(os.path.abspath(persist_directory))
+        self.embeddings = get_cached_embeddings(
+            embedding_model,
+            embeddings_url,
+            os.path.join(cache_dir, "embedding_cache.sqlite")
+        )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.vectorstore: Optional[VectorStore] = None
+    
+    @cached_property
+    def text_splitter(self) -> RecursiveCharacterTextSplitter:
+        """
+        Splitter measuring chunks in embedding-model tokens
+        
+        Created on first use, since loading the tokenizer may download it.
+        """
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name="cl100k_base",
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
         )
-        self.vectorstore: Optional[Chroma] = None
     
     def load_documents(self) -> List[Document]:
         """Load documents from the documents directory
@@ -65,54 +170,34 @@ class VectorStoreManager:
             print(f"Created documents directory: {self.documents_dir}")
             return []
         
-        all_documents = []
-        
-        # Define loaders for different file types that work with DirectoryLoader
-        # Note: PDF and DOCX files are handled separately below because they
-        # require different initialization (file path vs directory path)
-        loaders_config = [
-            {"glob": "**/*.txt", "loader_cls": TextLoader},
-            {"glob": "**/*.md", "loader_cls": UnstructuredMarkdownLoader},
-            {"glob": "**/*.csv", "loader_cls": CSVLoader},
-        ]
+        paths = sorted(
+            path for path in _walk_files(self.documents_dir)
+            if os.path.splitext(path)[1].lower() in LOADER_BY_EXT
+        )
         
-        # Load documents for each file type
-        for config in loaders_config:
+        def load_file(path: str) -> List[Document]:
+            """Load one file with the loader for its extension"""
+            loader_class = LOADER_BY_EXT[os.path.splitext(path)[1].lower()]
             try:
-                loader = DirectoryLoader(
-                    self.documents_dir,
-                    glob=config["glob"],
-                    loader_cls=config["loader_cls"],
-                    show_progress=False,
-                    silent_errors=True
-                )
-                documents = loader.load()
-                if documents:
-                    print(f"Loaded {len(documents)} {config['glob']} files")
-                    all_documents.extend(documents)
+                return loader_class(path).load()
             except Exception as e:
-                print(f"Error loading {config['glob']} files: {e}")
+                print(f"Error loading {path}: {e}")
+                return []
         
-        # Helper function to load files individually (for PDF and DOCX)
-        def load_files_individually(extension: str, loader_class):
-            """Load files one by one for loaders that require file paths"""
-            try:
-                files = [f for f in os.listdir(self.documents_dir) if f.endswith(extension)]
-                for file in files:
-                    try:
-                        file_path = os.path.join(self.documents_dir, file)
-                        loader = loader_class(file_path)
-                        documents = loader.load()
+        # Parsing (PyPDF, unstructured) is mostly I/O and subprocess bound, so
+        # files load concurrently; map keeps the document order deterministic
+        all_documents = []
+        loaded = Counter()
+        if paths:
+            max_workers = min(32, (os.cpu_count() or 1) * 4, len(paths))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for path, documents in zip(paths, executor.map(load_file, paths)):
+                    if documents:
+                        loaded[os.path.splitext(path)[1].lower()] += 1
                         all_documents.extend(documents)
-                        print(f"Loaded {extension.upper()}: {file}")
-                    except Exception as e:
-                        print(f"Error loading {extension} {file}: {e}")
-            except Exception as e:
-                print(f"Error processing {extension} files: {e}")
         
-        # Load PDF and DOCX files using individual file loaders
-        load_files_individually('.pdf', PyPDFLoader)
-        load_files_individually('.docx', UnstructuredWordDocumentLoader)
+        for extension, count in sorted(loaded.items()):
+            print(f"Loaded {count} {extension} files")
         
         print(f"Total documents loaded: {len(all_documents)}")
         return all_documents
@@ -123,35 +208,96 @@ class VectorStoreManager:
         print(f"Split into {len(chunks)} chunks")
         return chunks
     
-    def create_vectorstore(self, documents: List[Document]) -> Chroma:
-        """Create or load vector store from documents"""
-        if os.path.exists(self.persist_directory):
-            print(f"Loading existing vector store from {self.persist_directory}")
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings
-            )
+    def _open_vectorstore(self) -> Optional[VectorStore]:
+        """Open the persisted vector store, reusing the process-wide handle"""
+        persist_directory = os.path.abspath(self.persist_directory)
+        if self.backend == "faiss":
+            if os.path.exists(os.path.join(persist_directory, "index.faiss")):
+                self.vectorstore = _load_faiss(persist_directory, self.embeddings)
+            else:
+                self.vectorstore = None
         else:
-            print(f"Creating new vector store at {self.persist_directory}")
-            chunks = self.split_documents(documents)
-            
-            if not chunks:
-                print("No documents to index. Creating empty vector store.")
-                # Create with a dummy document
-                chunks = [Document(page_content="Empty knowledge base", metadata={})]
-            
-            self.vectorstore = Chroma.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                persist_directory=self.persist_directory
-            )
+            self.vectorstore = _open_vectorstore(persist_directory, self.embeddings)
+        return self.vectorstore
+    
+    def _is_empty(self) -> bool:
+        """Whether the opened vector store has no indexed chunks"""
+        if self.vectorstore is None:
+            return True
+        if self.backend == "faiss":
+            return self.vectorstore.index.ntotal == 0
+        return self.vectorstore._collection.count() == 0
+    
+    def _index_documents(self, documents: List[Document]):
+        """Split and index documents into the (empty) vector store"""
+        print(f"Creating new vector store at {self.persist_directory}")
+        chunks = self.split_documents(documents)
+        
+        if not chunks:
+            print("No documents to index. Creating empty vector store.")
+            # Create with a dummy document
+            chunks = [Document(page_content="Empty knowledge base", metadata={})]
+        
+        if self.backend == "faiss":
+            if len(chunks) > self.FAISS_MAX_CHUNKS:
+                print(
+                    f"Warning: {len(chunks)} chunks is past the point where exact "
+                    "FAISS search is fastest; consider the chroma backend"
+                )
+            self.vectorstore = FAISS.from_documents(chunks, self.embeddings, **FAISS_KWARGS)
+            self.vectorstore.save_local(self.persist_directory)
+            return
+        
+        self._add_chunks_to_chroma(chunks)
+    
+    def _add_chunks_to_chroma(self, chunks: List[Document]):
+        """
+        Add chunks to Chroma in bounded batches
+        
+        Each batch is embedded with one embed_documents call, which the
+        embedding cache splits into concurrent, token-capped API requests.
+        Batching also keeps writes under Chroma's maximum batch size and
+        bounds how many vectors are held in memory at once.
+        """
+        for start in range(0, len(chunks), self.INDEX_BATCH_SIZE):
+            self.vectorstore.add_documents(chunks[start:start + self.INDEX_BATCH_SIZE])
+    
+    def _open_or_index(self, load_documents: Callable[[], List[Document]]) -> VectorStore:
+        """
+        Open the persisted vector store, indexing documents if it is empty
+        
+        The check and the indexing run under a file lock in the store's
+        directory, so when several processes (e.g. Gunicorn workers) start
+        on an empty store, one indexes it and the others open the result.
+        """
+        os.makedirs(self.persist_directory, exist_ok=True)
+        with _file_lock(os.path.join(self.persist_directory, ".index.lock")):
+            self._open_vectorstore()
+            if self._is_empty():
+                self._index_documents(load_documents())
+            else:
+                print(f"Loading existing vector store from {self.persist_directory}")
         
         return self.vectorstore
     
+    def get_or_create_vectorstore(self) -> VectorStore:
+        """
+        Open the persisted vector store, loading and indexing documents
+        only when it is empty
+        """
+        return self._open_or_index(self.load_documents)
+    
+    def create_vectorstore(self, documents: List[Document]) -> VectorStore:
+        """Create or load vector store from documents"""
+        return self._open_or_index(lambda: documents)
+    
     def get_retriever(self, search_kwargs: dict = None):
         """Get a retriever from the vector store"""
         if self.vectorstore is None:
-            raise ValueError("Vector store not initialized. Call create_vectorstore first.")
+            raise ValueError(
+                "Vector store not initialized. "
+                "Call get_or_create_vectorstore or create_vectorstore first."
+            )
         
         if search_kwargs is None:
             search_kwargs = {"k": 4}
@@ -164,7 +310,11 @@ class VectorStoreManager:
             raise ValueError("Vector store not initialized.")
         
         chunks = self.split_documents(documents)
-        self.vectorstore.add_documents(chunks)
+        if self.backend == "faiss":
+            self.vectorstore.add_documents(chunks)
+            self.vectorstore.save_local(self.persist_directory)
+        else:
+            self._add_chunks_to_chroma(chunks)
         print(f"Added {len(chunks)} new chunks to vector store")
     
     def similarity_search(self, query: str, k: int = 4) -> List[Document]:
@@ -173,3 +323,47 @@ class VectorStoreManager:
             raise ValueError("Vector store not initialized.")
         
         return self.vectorstore.similarity_search(query, k=k)
+    
+    def similarity_search_batch(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """
+        Perform similarity search for several queries at once
+        
+        All queries are embedded in one call and searched in one index query.
+        
+        Args:
+            queries: Search queries
+            k: Number of documents to return per query
+        
+        Returns:
+            The matching documents for each query, in query order
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store not initialized.")
+        if not queries:
+            return []
+        
+        vectors = self.embeddings.embed_queries(queries)
+        
+        if self.backend == "faiss":
+            index = self.vectorstore.index
+            _, indices = index.search(np.array(vectors, dtype=np.float32), min(k, index.ntotal))
+            id_map = self.vectorstore.index_to_docstore_id
+            docstore = self.vectorstore.docstore
+            # FAISS pads with -1 when there are fewer than k results
+            return [
+                [docstore.search(id_map[i]) for i in row if i != -1]
+                for row in indices
+            ]
+        
+        results = self.vectorstore._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            include=["documents", "metadatas"]
+        )
+        return [
+            [
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(texts, metadatas)
+            ]
+            for texts, metadatas in zip(results["documents"], results["metadatas"])
+        ]
@@ -0,0 +1,214 @@
+"""
+Tests for the agent's run loop
+These drive AgenticRAGAgent with a fake tools-calling chat model, so they run
+offline without an OpenAI API key
+
+Run with pytest:
+    pytest test_agent.py
+"""
+
+import asyncio
+import sys
+import os
+import threading
+import time
+from typing import Any, List, Optional
+import pytest
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.agents import rag_agent
+from src.agents.rag_agent import AgenticRAGAgent
+from src.tools.retrieval_tool import RetrievalTool
+
+ANSWER = "Agentic RAG lets the model decide when to search."
+
+class _FakeToolsModel(BaseChatModel):
+    """
+    Chat model replaying canned replies, one per call
+    
+    Like ChatOpenAI, it only reports tokens to callbacks when streaming is set.
+    """
+    
+    replies: List[AIMessage]
+    streaming: bool = False
+    calls: int = 0
+    received: List[List[BaseMessage]] = []
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tools"
+    
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any
+    ) -> ChatResult:
+        message = self.replies[self.calls]
+        self.calls += 1
+        self.received.append(messages)
+        if self.streaming and run_manager is not None:
+            for word in message.content.split(" "):
+                run_manager.on_llm_new_token(word + " ")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+def _tool_calls(*queries: str) -> AIMessage:
+    """A reply asking for one knowledge base search per query"""
+    return AIMessage(content="", tool_calls=[
+        {"name": "knowledge_base_search", "args": {"__arg1": query}, "id": f"call_{i}"}
+        for i, query in enumerate(queries)
+    ])
+
+class _Retriever:
+    """Retriever returning one document naming the query"""
+    
+    def invoke(self, query):
+        return [Document(page_content=f"About {query}", metadata={"source": "test"})]
+    
+    async def ainvoke(self, query):
+        return await asyncio.to_thread(self.invoke, query)
+
+class _OverlapRetriever(_Retriever):
+    """
+    Retriever whose searches only succeed when `parties` of them overlap
+    
+    Earlier queries (by their trailing digit) finish last, so results come
+    back out of order.
+    """
+    
+    def __init__(self, parties: int):
+        self.barrier = threading.Barrier(parties, timeout=5)
+        self.finished: List[str] = []
+    
+    def invoke(self, query):
+        self.barrier.wait()
+        time.sleep(0.02 * (9 - int(query[-1])))
+        self.finished.append(query)
+        return super().invoke(query)
+
+def _make_agent(*replies: AIMessage, streaming: bool = False, retriever=None, **kwargs) -> AgenticRAGAgent:
+    """An agent searching retriever (_Retriever by default) and answering with the given replies"""
+    tool = RetrievalTool(retriever or _Retriever()).as_tool()
+    agent = AgenticRAGAgent(tools=[tool], verbose=False, **kwargs)
+    agent.llm = _FakeToolsModel(replies=list(replies), streaming=streaming)
+    return agent
+
+def test_llm_streams(monkeypatch):
+    """Test that the real LLM is created in streaming mode"""
+    # The client only needs a key to be constructed
+    monkeypatch.setenv("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY") or "sk-test")
+    assert AgenticRAGAgent(tools=[]).llm.streaming, "chat_stream needs a streaming LLM"
+
+def test_chat_stream_yields_tokens():
+    """Test that the answer is streamed in several chunks"""
+    agent = _make_agent(_tool_calls("agentic RAG"), AIMessage(content=ANSWER), streaming=True)
+    
+    chunks = list(agent.chat_stream("What is agentic RAG?"))
+    assert len(chunks) > 1, f"Answer was not streamed: {chunks}"
+    assert "".join(chunks).strip() == ANSWER
+    assert agent.get_conversation_history().endswith(f"Assistant: {ANSWER}")
+
+def test_cli_chat_stream_yields_tokens():
+    """Test that the CLI chatbot streams the agent's answer"""
+    from chatbot import AgenticRAGChatbot
+    
+    # Skip __init__, which indexes the documents with the real embeddings
+    bot = AgenticRAGChatbot.__new__(AgenticRAGChatbot)
+    bot.agent = _make_agent(AIMessage(content=ANSWER), streaming=True)
+    
+    chunks = list(bot.chat_stream("What is agentic RAG?"))
+    assert len(chunks) > 1, f"Answer was not streamed: {chunks}"
+    assert "".join(chunks).strip() == ANSWER
+
+@pytest.mark.parametrize("use_async", [False, True], ids=["chat", "achat"])
+def test_tool_calls_run_concurrently(use_async):
+    """Test that the tool calls of one step overlap and keep their order"""
+    queries = ["topic 0", "topic 1", "topic 2"]
+    retriever = _OverlapRetriever(parties=len(queries))
+    agent = _make_agent(
+        _tool_calls(*queries), AIMessage(content=ANSWER),
+        retriever=retriever, max_tool_concurrency=len(queries)
+    )
+    
+    if use_async:
+        output = asyncio.run(agent.achat("Tell me about three topics"))
+    else:
+        output = agent.chat("Tell me about three topics")
+    assert output == ANSWER
+    assert retriever.finished == queries[::-1], "Searches should have run at once"
+    
+    # The model sees the results in the order it asked for them
+    results = [m for m in agent.llm.received[-1] if isinstance(m, ToolMessage)]
+    assert [m.tool_call_id for m in results] == ["call_0", "call_1", "call_2"]
+    for message, query in zip(results, queries):
+        assert f"About {query}" in message.content, message.content
+
+def test_identical_chats_run_once(monkeypatch):
+    """Test that concurrent identical messages share one agent run"""
+    agent = _make_agent(AIMessage(content=ANSWER))
+    callers = 4
+    
+    # Hold the leader's model call until every caller has joined
+    joined = threading.Semaphore(0)
+    join_inflight = agent._join_inflight
+    
+    def counting_join(message, session_id):
+        joined.release()
+        return join_inflight(message, session_id)
+    
+    monkeypatch.setattr(agent, "_join_inflight", counting_join)
+    generate = agent.llm._generate
+    
+    def gated_generate(*args, **kwargs):
+        for _ in range(callers):
+            assert joined.acquire(timeout=5), "Callers didn't join"
+        return generate(*args, **kwargs)
+    
+    monkeypatch.setattr(agent.llm, "_generate", gated_generate)
+    
+    outputs = []
+    threads = [
+        threading.Thread(target=lambda: outputs.append(agent.chat("What is RAG?")))
+        for _ in range(callers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert outputs == [ANSWER] * callers
+    assert agent.llm.calls == 1, "Identical messages should run the agent once"
+    assert not agent._inflight, "Finished requests should be forgotten"
+
+def test_history_is_trimmed(monkeypatch):
+    """Test that history keeps the last turns and fits the token budget"""
+    agent = _make_agent(max_history_turns=2)
+    for i in range(5):
+        agent._save_turn("default", f"question {i}", f"answer {i}")
+    
+    messages = agent.get_memory("default").chat_memory.messages
+    assert [m.content for m in messages] == ["question 3", "answer 3", "question 4", "answer 4"], \
+        "Stored history should be trimmed to the window"
+    
+    # Count words instead of tokens so no tokenizer download is needed
+    class WordEncoding:
+        def encode(self, text):
+            return text.split()
+    
+    monkeypatch.setattr(rag_agent, "_get_encoding", lambda model_name: WordEncoding())
+    monkeypatch.setattr(
+        rag_agent, "_system_prompt_tokens",
+        lambda model_name: tuple(rag_agent.SYSTEM_PROMPT.split())
+    )
+    
+    # Room for the system prompt and one exchange (four words)
+    agent.max_prompt_tokens = len(rag_agent.SYSTEM_PROMPT.split()) + 5
+    assert [m.content for m in agent._load_history("default")] == ["question 4", "answer 4"], \
+        "Oldest exchanges should be dropped to fit the budget"
@@ -0,0 +1,128 @@
+"""
+Tests for the semantic query cache
+Caches use deterministic fake embeddings (see conftest.py), so no OpenAI API
+key is needed
+"""
+
+import asyncio
+import functools
+import inspect
+import sys
+import os
+import time
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+def test_query_cache_initialization():
+    """Test that the cache can be disabled"""
+    from src.utils.query_cache import QueryCache
+    
+    cache = QueryCache(enabled=False)
+    assert cache.cache_store is None, "Disabled cache should not open a store"
+    assert cache.get("anything") is None, "Disabled cache should always miss"
+    cache.set("anything", "response")
+
+def test_query_cache_opens_store(make_query_cache):
+    """Test that an enabled cache opens its store"""
+    cache = make_query_cache()
+    assert cache.cache_store is not None, "Enabled cache should open a store"
+
+def test_canonicalize_query():
+    """Test that trivially different queries share a canonical form"""
+    from src.utils.query_cache import canonicalize_query
+    
+    assert canonicalize_query("What is RAG?") == "what is rag"
+    assert canonicalize_query("  what   is\trag ") == "what is rag"
+    assert canonicalize_query("What is RAG?!") == "what is rag"
+    # Composed and decomposed forms of the same character match
+    assert canonicalize_query("Caf\u00e9") == canonicalize_query("Cafe\u0301")
+    assert canonicalize_query("What is RAG") != canonicalize_query("What is ML")
+
+def test_query_cache_operations(make_query_cache):
+    """Test storing and retrieving responses"""
+    cache = make_query_cache()
+    cache.set("What is RAG?", "RAG combines retrieval with generation.")
+    
+    assert cache.get("What is RAG?") == "RAG combines retrieval with generation.", \
+        "Identical query should hit"
+    assert cache.get("  what is rag ") == "RAG combines retrieval with generation.", \
+        "Canonically equal query should hit"
+    assert cache.get("How do I bake bread?") is None, "Unrelated query should miss"
+    assert cache.get("What is RAG?", session_id="other") is None, \
+        "Queries are scoped to their session"
+    
+    cache.set("What is retrieval augmented generation?", "Search, then answer.")
+    assert cache.get("What is retrieval-augmented generation?") == "Search, then answer.", \
+        "Similar query should hit through the index"
+    
+    asyncio.run(cache.aset("What is ML?", "ML learns from data."))
+    assert asyncio.run(cache.aget("what is ml")) == "ML learns from data.", \
+        "Async set/get should round-trip"
+    
+    # Buffered writes reach the store on flush
+    cache.flush()
+    reopened = make_query_cache()
+    assert reopened.get("What is RAG?") == "RAG combines retrieval with generation.", \
+        "Flushed entry should be persisted"
+
+def test_pending_entries_flush_on_timer(make_query_cache):
+    """Test that a lone buffered entry reaches the store without another set()"""
+    cache = make_query_cache()
+    cache.WRITE_FLUSH_INTERVAL = 0.05
+    cache.set("What is RAG?", "RAG combines retrieval with generation.")
+    
+    deadline = time.monotonic() + 5
+    while cache.cache_store._collection.count() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.cache_store._collection.count() == 1, "Entry should be flushed by the timer"
+    assert not cache._pending, "Flushed entry should leave the buffer"
+
+def test_cache_ttl(make_query_cache, monkeypatch):
+    """Test that expired entries are not served"""
+    from src.utils import query_cache
+    
+    cache = make_query_cache(cache_ttl=2)
+    cache.set("What is RAG?", "RAG combines retrieval with generation.")
+    assert cache.get("What is RAG?") is not None, "Fresh entry should hit"
+    
+    # Move the cache's clock past the TTL instead of sleeping
+    start = time.time()
+    monkeypatch.setattr(query_cache, "_now", lambda: start + 10)
+    assert cache.get("What is RAG?") is None, "Expired entry should miss"
+
+def test_expired_entries_are_skipped(make_query_cache, monkeypatch):
+    """Test that an expired neighbour doesn't hide a fresh match and is pruned"""
+    from src.utils import query_cache
+    
+    start = time.time()
+    monkeypatch.setattr(query_cache, "_now", lambda: start)
+    cache = make_query_cache(cache_ttl=60)
+    cache.set("What is retrieval augmented generation about?", "Old answer.")
+    
+    monkeypatch.setattr(query_cache, "_now", lambda: start + 120)
+    cache.set("What is retrieval augmented generation in short?", "New answer.")
+    assert cache.get("What is retrieval augmented generation?") == "New answer.", \
+        "Closer expired entry should be skipped, not returned as a miss"
+    
+    # Flushing drops the expired entry from the index and the store
+    cache.flush()
+    assert cache._entries.count(None) == 1, "Expired entry should leave the index"
+    assert cache.cache_store._collection.count() == 1, "Expired entry should leave the store"
+    cache.set("How does HNSW search work?", "Greedily, layer by layer.")
+    assert len(cache._entries) == 2, "New entries should reuse expired labels"
+    assert cache.get("How does HNSW search work?") == "Greedily, layer by layer."
+
+@functools.cache
+def _agent_params():
+    """Names of AgenticRAGAgent's constructor parameters (computed once)"""
+    from src.agents.rag_agent import AgenticRAGAgent
+    return frozenset(inspect.signature(AgenticRAGAgent.__init__).parameters)
+
+def test_agent_with_cache():
+    """Test that the agent accepts a query cache"""
+    assert "query_cache" in _agent_params(), "AgenticRAGAgent should accept query_cache"
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
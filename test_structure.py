@@ -0,0 +1,27 @@
+"""
+Tests for the project's file structure
+Uses the same manifest and directory listings as validate.py
+"""
+
+import os
+import sys
+import pytest
+
+# Add the project root to path
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from _manifest import REQUIRED_FILES
+from validate import check_file_exists, list_directories
+
+@pytest.fixture(scope="session")
+def present_files():
+    """Required files that exist, from one listing per directory"""
+    paths = {path: os.path.join(ROOT, path) for path in REQUIRED_FILES}
+    list_directories(paths.values())
+    return frozenset(path for path, full_path in paths.items() if check_file_exists(full_path))
+
+@pytest.mark.parametrize("path", sorted(REQUIRED_FILES))
+def test_required_file_exists(path, present_files):
+    """Test that a required file exists"""
+    assert path in present_files, f"Missing: {path}"